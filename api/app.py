@@ -1,66 +1,531 @@
 # Import required FastAPI components for building the API
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.routing import APIRoute
 # Import Pydantic for data validation and settings management
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 # Import OpenAI client for interacting with OpenAI's API
-from openai import OpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+import httpx
+import asyncio
 import os
-import json
-from typing import Optional, List
+import re
+import time
+import hashlib
+import logging
+import orjson
+import tiktoken
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from functools import wraps
+from typing import Annotated, AsyncIterator, Literal, Optional, List
+from typing_extensions import TypedDict
+
+# Streaming batch settings: the batch size starts at STREAM_BATCH_MIN deltas and grows by
+# STREAM_BATCH_GROWTH after each flush up to STREAM_BATCH_SIZE (e.g. 1, 3, 9, 27, 50), so the
+# first tokens arrive quickly while later ones are sent in fewer, larger writes
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "50"))
+STREAM_BATCH_MIN = int(os.getenv("STREAM_BATCH_MIN", "1"))
+STREAM_BATCH_GROWTH = int(os.getenv("STREAM_BATCH_GROWTH", "3"))
+STREAM_FLUSH_INTERVAL = float(os.getenv("STREAM_FLUSH_INTERVAL", "0.05"))  # seconds
+
+logger = logging.getLogger(__name__)
+
+# Tokenizer used to count prompt tokens. It is loaded once at startup, off the event loop, because
+# tiktoken downloads its BPE file on first load (set TIKTOKEN_CACHE_DIR to a vendored copy to avoid
+# the download). If loading fails, token counts fall back to a character-based estimate.
+ENCODING: Optional[tiktoken.Encoding] = None
+
+def load_encoding():
+    global ENCODING
+    try:
+        ENCODING = tiktoken.encoding_for_model("gpt-4o-mini")
+    except Exception as e:
+        logger.warning("Could not load the tiktoken encoding, estimating tokens from characters: %s", e)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await asyncio.to_thread(load_encoding)
+    yield
+    # Close the pooled OpenAI and cache connections on shutdown
+    await client_cache.close()
+    await response_cache.close()
 
 # Initialize FastAPI application with a title
-app = FastAPI(title="Decision Making API")
+# ORJSONResponse serializes JSON responses with orjson instead of the stdlib json module
+app = FastAPI(title="Decision Making API", default_response_class=ORJSONResponse, lifespan=lifespan)
+
+# Decode JSON request bodies with orjson before Pydantic validation
+class ORJSONRequest(Request):
+    async def json(self):
+        if not hasattr(self, "_json"):
+            # orjson.JSONDecodeError subclasses json.JSONDecodeError, so FastAPI still answers 422
+            self._json = orjson.loads(await self.body())
+        return self._json
+
+class ORJSONRoute(APIRoute):
+    def get_route_handler(self):
+        route_handler = super().get_route_handler()
+
+        async def orjson_route_handler(request: Request):
+            return await route_handler(ORJSONRequest(request.scope, request.receive))
+
+        return orjson_route_handler
+
+# Must be set before the endpoints below are registered
+app.router.route_class = ORJSONRoute
+
+# Reject oversized request bodies before they are read and validated
+MAX_REQUEST_BODY_SIZE = 64 * 1024  # bytes
+
+class BodySizeLimitMiddleware:
+    """ASGI middleware that answers 413 when the request body exceeds the limit.
+
+    A declared Content-Length is checked up front; bodies without one (Transfer-Encoding: chunked)
+    are counted as they are received.
+    """
+
+    def __init__(self, app, max_body_size: int):
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                try:
+                    length = int(value)
+                except ValueError:
+                    response = ORJSONResponse({"detail": "Invalid Content-Length header"}, status_code=400)
+                    await response(scope, receive, send)
+                    return
+                if length > self.max_body_size:
+                    response = ORJSONResponse({"detail": "Request body too large"}, status_code=413)
+                    await response(scope, receive, send)
+                    return
+                break
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                # Raised while the endpoint reads its body; FastAPI passes HTTPExceptions through
+                # from there, so this is answered as a 413 instead of a body parsing error
+                if received > self.max_body_size:
+                    raise HTTPException(status_code=413, detail="Request body too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+# Added before CORS so that CORS stays the outermost middleware and 413 responses get CORS headers
+app.add_middleware(BodySizeLimitMiddleware, max_body_size=MAX_REQUEST_BODY_SIZE)
+
+# Compress JSON/markdown responses, but never streaming ones: gzip buffers output and delays the first tokens
+STREAMING_PATHS = {"/api/chat", "/api/conversational-options", "/api/generate-plan"}
+
+class NonStreamingGZipMiddleware:
+    """ASGI middleware that applies GZipMiddleware to every path except the streaming endpoints"""
+
+    def __init__(self, app, minimum_size: int):
+        self.app = app
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] not in STREAMING_PATHS:
+            await self.gzip(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+app.add_middleware(NonStreamingGZipMiddleware, minimum_size=500)
 
 # Configure CORS (Cross-Origin Resource Sharing) middleware
-# This allows the API to be accessed from different domains/origins
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Allows requests from any origin
-    allow_credentials=True,  # Allows cookies to be included in requests
-    allow_methods=["*"],  # Allows all HTTP methods (GET, POST, etc.)
-    allow_headers=["*"],  # Allows all headers in requests
-)
+# This allows the API to be accessed from different domains/origins. It behaves like
+# CORSMiddleware(allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
+# but the response headers are assembled once, so streamed chunks pass through untouched
+class AllowAllCORSMiddleware:
+    """ASGI middleware that allows every origin, method and header"""
+
+    # Added to every response to a cross-origin request
+    simple_headers = [
+        (b"access-control-allow-origin", b"*"),  # Allows requests from any origin
+        (b"access-control-allow-credentials", b"true"),  # Allows cookies to be included in requests
+    ]
+    # Added to every preflight (OPTIONS) response
+    preflight_headers = [
+        (b"access-control-allow-methods", b"DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"),
+        (b"access-control-max-age", b"600"),
+        (b"access-control-allow-credentials", b"true"),
+        (b"vary", b"Origin"),
+        (b"content-type", b"text/plain; charset=utf-8"),
+        (b"content-length", b"2"),
+    ]
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = request_method = request_headers = None
+        has_cookie = False
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value
+            elif name == b"cookie":
+                has_cookie = True
+            elif name == b"access-control-request-method":
+                request_method = value
+            elif name == b"access-control-request-headers":
+                request_headers = value
+
+        # Same-origin requests need no CORS headers
+        if origin is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Answer preflight requests directly, mirroring back the requested headers
+        if scope["method"] == "OPTIONS" and request_method is not None:
+            headers = [*self.preflight_headers, (b"access-control-allow-origin", origin)]
+            if request_headers is not None:
+                headers.append((b"access-control-allow-headers", request_headers))
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            await send({"type": "http.response.body", "body": b"OK"})
+            return
+
+        # Requests with cookies must get the specific origin back instead of "*"
+        if has_cookie:
+            cors_headers = [
+                (b"access-control-allow-origin", origin),
+                (b"access-control-allow-credentials", b"true"),
+                (b"vary", b"Origin"),
+            ]
+        else:
+            cors_headers = self.simple_headers
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), *cors_headers]
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
+
+app.add_middleware(AllowAllCORSMiddleware)
+
+# Base model for request bodies: keep validation to the declared fields only
+# (unknown keys are dropped, strings are not rewritten, assignments are not re-validated)
+class APIRequest(BaseModel):
+    model_config = ConfigDict(
+        extra="ignore",
+        str_strip_whitespace=False,
+        validate_assignment=False,
+        revalidate_instances="never",
+    )
+
+# Size limits for request fields, so a single request cannot forward an unbounded prompt
+LongText = Annotated[str, Field(max_length=8000)]
+ShortText = Annotated[str, Field(max_length=200)]
+# Malformed API keys are rejected during validation, before any OpenAI client is created
+ApiKey = Annotated[str, Field(pattern=r"^sk-[A-Za-z0-9_-]{20,}$")]
+
+# Nested request shapes, typed so Pydantic validates only the expected keys
+class HistoryMsg(TypedDict):
+    role: Literal["user", "assistant"]
+    content: LongText
+
+class CriterionIn(BaseModel):
+    name: ShortText
+    weight: float
 
 # Define data models for decision-making endpoints
-class ChatRequest(BaseModel):
-    developer_message: str
-    user_message: str
+class ChatRequest(APIRequest):
+    developer_message: LongText
+    user_message: LongText
     model: Optional[str] = "gpt-4o-mini"
-    api_key: str
+    api_key: ApiKey
 
-class SuggestOptionsRequest(BaseModel):
-    decision: str
-    api_key: str
+class SuggestOptionsRequest(APIRequest):
+    decision: LongText
+    api_key: ApiKey
     model: Optional[str] = "gpt-4o-mini"
 
-class SuggestCriteriaRequest(BaseModel):
-    decision: str
-    options: List[str]
-    api_key: str
+class SuggestCriteriaRequest(APIRequest):
+    decision: LongText
+    options: Annotated[List[ShortText], Field(min_length=1, max_length=32)]
+    api_key: ApiKey
     model: Optional[str] = "gpt-4o-mini"
 
-class GeneratePlanRequest(BaseModel):
-    decision: str
-    selected_option: str
-    criteria: List[dict]  # {name: str, weight: float}
-    api_key: str
+class GeneratePlanRequest(APIRequest):
+    decision: LongText
+    selected_option: LongText
+    criteria: Annotated[List[CriterionIn], Field(max_length=32)]
+    api_key: ApiKey
     model: Optional[str] = "gpt-4o-mini"
 
-class ConversationalOptionsRequest(BaseModel):
-    decision: str
-    conversation_history: List[dict]  # [{"role": "user"|"assistant", "content": str}]
-    current_options: List[str]  # Current options the user has
-    user_message: str
-    api_key: str
+class ConversationalOptionsRequest(APIRequest):
+    decision: LongText
+    conversation_history: Annotated[List[HistoryMsg], Field(max_length=50)]
+    current_options: Annotated[List[ShortText], Field(max_length=32)]  # Current options the user has
+    user_message: LongText
+    api_key: ApiKey
     model: Optional[str] = "gpt-4o-mini"
 
+# Define data models for parsing LLM output
+class Criterion(BaseModel):
+    name: str
+    weight: float = 0
+
+# Parses and validates a JSON array of criteria in a single pass
+CriteriaList = TypeAdapter(List[Criterion])
+
+# Prompt templates, built once at import time. Every prompt is sent as a static system message,
+# then a static instructions message, then a final message holding only the per-request fields.
+# Keeping the static prefix byte-identical across calls lets OpenAI's prompt cache reuse it.
+JSON_SYSTEM_PROMPT = "You are a helpful decision-making assistant. Always respond with valid JSON."
+
+SUGGEST_OPTIONS_INSTRUCTIONS = """You are a decision-making assistant. The next message describes a decision a user needs to make.
+
+Please suggest 4-6 realistic and diverse options they could consider. 
+Provide your response as a JSON array of strings, where each string is a potential option.
+
+Example format:
+["Option 1", "Option 2", "Option 3", "Option 4"]
+
+Make sure the options are:
+1. Realistic and actionable
+2. Diverse in approach
+3. Relevant to the decision context
+4. Clearly stated"""
+
+SUGGEST_OPTIONS_TEMPLATE = 'Decision: "{decision}"'
+
+SUGGEST_CRITERIA_INSTRUCTIONS = """You are a decision-making assistant. The next message describes a decision a user needs to make and the options they are considering.
+
+Please suggest 4-6 important criteria they should consider when evaluating these options, along with suggested weights (importance percentages that sum to 100%).
+
+Provide your response as a JSON array of objects, where each object has "name" and "weight" properties.
+
+Example format:
+[
+    {"name": "Cost", "weight": 25},
+    {"name": "Time Required", "weight": 20},
+    {"name": "Long-term Benefits", "weight": 30},
+    {"name": "Risk Level", "weight": 25}
+]
+
+Make sure:
+1. Criteria are relevant to the decision and options
+2. Weights are realistic and sum to 100
+3. Include both quantitative and qualitative factors
+4. Consider short-term and long-term impacts"""
+
+SUGGEST_CRITERIA_TEMPLATE = """Decision: "{decision}"
+
+They are considering these options:
+{options_text}"""
+
+CONVERSATIONAL_SYSTEM_PROMPT = """You are a helpful decision-making assistant specializing in generating and refining options. 
+
+Your role is to:
+1. Help users brainstorm creative and realistic options for their decisions
+2. Suggest refinements or variations of existing options
+3. Ask clarifying questions to better understand their needs
+4. Provide context and insights about different approaches
+5. Help them think outside the box while staying practical
+
+Guidelines:
+- Be conversational and engaging
+- Ask follow-up questions when helpful
+- Suggest specific, actionable options
+- Consider both conventional and unconventional approaches
+- Help users explore different angles and perspectives
+- Keep responses concise but informative
+- When suggesting options, explain briefly why they might be worth considering
+
+You should respond naturally to the user's questions and requests about their decision options."""
+
+CONVERSATIONAL_INSTRUCTIONS = """The messages after this one are the recent conversation with the user. The final message gives the decision context, the user's current options and the user's current message.
+
+Please respond conversationally to help them with their options. If they're asking for new suggestions, provide 2-4 specific options with brief explanations. If they're asking questions or want refinements, address those directly."""
+
+CONVERSATIONAL_USER_TEMPLATE = """Decision Context: "{decision}"
+
+Current options the user has:
+{current_options_text}
+
+User's current message: "{user_message}\""""
+
+# Number of most recent conversation messages sent to the model
+CONVERSATION_HISTORY_WINDOW = 6
+
+PLAN_SYSTEM_PROMPT = "You are a helpful decision-making and planning assistant. Provide detailed, actionable plans."
+
+# The plan is generated as two independent parts requested in parallel and joined in order
+PLAN_GUIDELINES = """Make the plan:
+- Specific and actionable
+- Realistic and achievable
+- Well-structured with clear timelines
+- Comprehensive but not overwhelming
+
+Use markdown formatting for better readability."""
+
+GENERATE_PLAN_TIMELINE_INSTRUCTIONS = """You are a decision-making assistant. The next message describes a decision a user has made, the option they selected and the criteria it was evaluated on.
+
+Please create the timeline of a detailed implementation plan for executing this decision. Include:
+
+1. **Immediate Next Steps** (What to do in the next 1-7 days)
+2. **Short-term Actions** (What to do in the next 1-4 weeks)
+3. **Medium-term Milestones** (What to achieve in 1-3 months)
+4. **Long-term Goals** (What to accomplish in 3-12 months)
+
+Sections on challenges, success metrics and resources follow separately, so do not include them or end with a summary.
+
+""" + PLAN_GUIDELINES
+
+GENERATE_PLAN_SUPPORT_INSTRUCTIONS = """You are a decision-making assistant. The next message describes a decision a user has made, the option they selected and the criteria it was evaluated on.
+
+Please write the closing sections of a detailed implementation plan for executing this decision. Include:
+
+5. **Potential Challenges** and how to address them
+6. **Success Metrics** to track progress
+7. **Resources Needed** (time, money, people, tools, etc.)
+
+These sections follow a timeline (next steps through long-term goals) written separately, so keep the numbering above and do not add a title or introduction.
+
+""" + PLAN_GUIDELINES
+
+GENERATE_PLAN_TEMPLATE = """Decision: "{decision}"
+Selected Option: "{selected_option}"
+
+This choice was evaluated based on these criteria:
+{criteria_text}"""
+
+# Matches a line starting with a bullet or quote and captures the text without the surrounding markers
+BULLET_RE = re.compile(r'^[ \t]*[-*•"][-*•" \t]*([^-*•"\s].*?)[-*•" \t\r,]*$', re.MULTILINE)
+
+# Cache of OpenAI clients per API key, so connections and TLS sessions are pooled across requests
+class ClientCache:
+    """LRU cache of AsyncOpenAI clients that closes the clients it evicts once they are no longer in use.
+
+    Requests hold a lease on their client (acquire/retain and release), so evicting a client never
+    closes the connections of a response that is still streaming from it.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.clients: OrderedDict[str, AsyncOpenAI] = OrderedDict()
+        self.leases: dict[AsyncOpenAI, int] = {}  # Number of in-flight requests using each client
+        self.evicted = set()  # Evicted clients still in use, closed when their last lease is released
+        self.closing = set()  # Keeps references to pending close tasks
+
+    def acquire(self, api_key: str) -> AsyncOpenAI:
+        client = self.clients.get(api_key)
+        if client is not None:
+            self.clients.move_to_end(api_key)
+        else:
+            client = self.clients[api_key] = AsyncOpenAI(
+                api_key=api_key,
+                http_client=DefaultAsyncHttpxClient(
+                    http2=True,
+                    limits=httpx.Limits(max_connections=1000, max_keepalive_connections=100),
+                ),
+            )
+            while len(self.clients) > self.maxsize:
+                _, evicted = self.clients.popitem(last=False)
+                if evicted in self.leases:
+                    self.evicted.add(evicted)
+                else:
+                    self.schedule_close(evicted)
+        self.retain(client)
+        return client
+
+    def retain(self, client: AsyncOpenAI):
+        self.leases[client] = self.leases.get(client, 0) + 1
+
+    def release(self, client: AsyncOpenAI):
+        self.leases[client] -= 1
+        if self.leases[client] == 0:
+            del self.leases[client]
+            if client in self.evicted:
+                self.evicted.discard(client)
+                self.schedule_close(client)
+
+    def schedule_close(self, client: AsyncOpenAI):
+        task = asyncio.get_running_loop().create_task(client.close())
+        self.closing.add(task)
+        task.add_done_callback(self.closing.discard)
+
+    async def close(self):
+        clients = [*self.clients.values(), *self.evicted]
+        self.clients.clear()
+        self.evicted.clear()
+        await asyncio.gather(*(client.close() for client in clients), *self.closing)
+
+client_cache = ClientCache(maxsize=256)
+
+# Helper function to use a cached OpenAI client for an API key
+@contextmanager
+def leased_client(api_key: str):
+    """Yield a reusable client (so connections and TLS sessions are pooled across requests),
+    leased so that it is not closed while the request is using it"""
+    client = client_cache.acquire(api_key)
+    try:
+        yield client
+    finally:
+        client_cache.release(client)
+
+class LeasedStreamingResponse(StreamingResponse):
+    """StreamingResponse that keeps its own lease on the client until the stream has been sent or has failed"""
+
+    def __init__(self, client: AsyncOpenAI, content, **kwargs):
+        super().__init__(content, **kwargs)
+        self.client = client
+        client_cache.retain(client)
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            client_cache.release(self.client)
+
+# Token budget for the conversation history sent to OpenAI; the oldest messages beyond it are dropped.
+# The rest of the prompt (the static instructions and the current request) is bounded by the field limits.
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "4096"))
+
+# Average characters per token, used when the tokenizer is unavailable
+CHARS_PER_TOKEN = 4
+
+def count_tokens(text: str) -> int:
+    if ENCODING is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(ENCODING.encode_ordinary(text))
+
+# Helper function to fit the conversation history into the token budget
+def cap_history(history: List[HistoryMsg], budget: int = HISTORY_TOKEN_BUDGET) -> List[HistoryMsg]:
+    """Keep the newest history messages that fit in the token budget, dropping the oldest first"""
+    kept = []
+    for msg in reversed(history):
+        budget -= count_tokens(msg["content"])
+        if budget < 0:
+            break
+        kept.append(msg)
+    kept.reverse()
+    return kept
+
 # Helper function to get LLM response
-async def get_llm_response(client: OpenAI, messages: List[dict], model: str = "gpt-4o-mini"):
+async def get_llm_response(client: AsyncOpenAI, messages: List[dict], model: str = "gpt-4o-mini"):
     """Get a non-streaming response from the LLM"""
     try:
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model=model,
             messages=messages,
             temperature=0.7
@@ -69,17 +534,177 @@ async def get_llm_response(client: OpenAI, messages: List[dict], model: str = "g
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"LLM API error: {str(e)}")
 
+# Helper function to start a streaming LLM response
+async def get_llm_stream(client: AsyncOpenAI, messages: List[dict], model: str = "gpt-4o-mini"):
+    """Start a streaming response from the LLM; errors creating it are raised before streaming begins"""
+    try:
+        return await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0.7,
+            stream=True
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"LLM API error: {str(e)}")
+
+# Helper function to stream the text deltas of a chat completion in batches
+async def batch_stream(stream) -> AsyncIterator[str]:
+    """Yield the content of a streaming completion in growing batches of deltas.
+
+    The completion is closed when the stream ends, fails or is abandoned (e.g. the client disconnects),
+    so OpenAI stops generating (and billing) tokens nobody will read.
+    """
+    buf = []
+    batch_size = STREAM_BATCH_MIN
+    last_flush = time.monotonic()
+    try:
+        async for chunk in stream:
+            if not chunk.choices or chunk.choices[0].delta.content is None:
+                continue
+            buf.append(chunk.choices[0].delta.content)
+            # Flush when the batch is full or it has been held long enough to feel laggy
+            now = time.monotonic()
+            if len(buf) >= batch_size or now - last_flush >= STREAM_FLUSH_INTERVAL:
+                yield "".join(buf)
+                buf.clear()
+                batch_size = min(batch_size * STREAM_BATCH_GROWTH, STREAM_BATCH_SIZE)
+                last_flush = now
+        # Always flush whatever is left when the stream ends
+        if buf:
+            yield "".join(buf)
+    finally:
+        await stream.close()
+
+# Response cache for the non-streaming endpoints: exact match on the normalised request.
+# Uses Redis when REDIS_URL is set, otherwise a bounded in-process store (per worker).
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))  # seconds, 0 disables caching
+RESPONSE_CACHE_MAXSIZE = int(os.getenv("RESPONSE_CACHE_MAXSIZE", "1024"))
+REDIS_URL = os.getenv("REDIS_URL")
+
+class MemoryCache:
+    """Bounded in-process cache with per-entry expiry"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: int):
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    async def close(self):
+        self.entries.clear()
+
+class RedisCache:
+    """Cache stored in Redis so it is shared between workers"""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+        self.redis = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.redis.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: int):
+        await self.redis.setex(key, ttl, value)
+
+    async def close(self):
+        await self.redis.aclose()
+
+response_cache = RedisCache(REDIS_URL) if REDIS_URL else MemoryCache(RESPONSE_CACHE_MAXSIZE)
+
+def cache_key(endpoint: str, request: BaseModel) -> str:
+    """Build a cache key from the request fields, ignoring the API key and decision formatting"""
+    fields = request.model_dump(exclude={"api_key"})
+    fields["decision"] = " ".join(fields["decision"].split()).casefold()
+    return "response:" + hashlib.sha256(orjson.dumps([endpoint, fields], option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+# A cache outage should never fail the request, so errors are logged and treated as a miss
+async def cache_get(key: str) -> Optional[bytes]:
+    try:
+        return await response_cache.get(key)
+    except Exception:
+        logger.warning("Response cache lookup failed", exc_info=True)
+        return None
+
+async def cache_set(key: str, value: bytes):
+    try:
+        await response_cache.set(key, value, RESPONSE_CACHE_TTL)
+    except Exception:
+        logger.warning("Response cache store failed", exc_info=True)
+
+def cached(endpoint: str):
+    """Serve repeated requests to an endpoint from the response cache instead of the LLM.
+
+    Handlers can return a Response (e.g. for a fallback answer) to have it sent without being cached.
+    """
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(request):
+            if RESPONSE_CACHE_TTL <= 0:
+                return await func(request)
+            key = cache_key(endpoint, request)
+            hit = await cache_get(key)
+            if hit is not None:
+                return orjson.loads(hit)
+            result = await func(request)
+            if isinstance(result, Response):
+                return result
+            result = jsonable_encoder(result)
+            await cache_set(key, orjson.dumps(result))
+            return result
+        return wrapper
+    return decorator
+
+def cached_stream(endpoint: str, media_type: str):
+    """Like cached, for endpoints returning a StreamingResponse: the text is stored once the stream completes"""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(request):
+            if RESPONSE_CACHE_TTL <= 0:
+                return await func(request)
+            key = cache_key(endpoint, request)
+            hit = await cache_get(key)
+            if hit is not None:
+                return Response(hit, media_type=media_type)
+            response = await func(request)
+            body_iterator = response.body_iterator
+
+            # Pass the chunks through while keeping a copy; partial (failed) streams are not stored
+            async def tee():
+                parts = []
+                async for text in body_iterator:
+                    parts.append(text)
+                    yield text
+                await cache_set(key, "".join(parts).encode())
+
+            response.body_iterator = tee()
+            return response
+        return wrapper
+    return decorator
+
 # Define the main chat endpoint that handles POST requests
 @app.post("/api/chat")
 async def chat(request: ChatRequest):
     try:
-        # Initialize OpenAI client with the provided API key
-        client = OpenAI(api_key=request.api_key)
-        
-        # Create an async generator function for streaming responses
-        async def generate():
-            # Create a streaming chat completion request
-            stream = client.chat.completions.create(
+        # Get the (cached) OpenAI client for the provided API key
+        with leased_client(request.api_key) as client:
+            # Create a streaming chat completion request before the response starts, so that
+            # OpenAI errors are returned as an HTTP error status
+            stream = await client.chat.completions.create(
                 model=request.model,
                 messages=[
                     {"role": "developer", "content": request.developer_message},
@@ -87,130 +712,79 @@ async def chat(request: ChatRequest):
                 ],
                 stream=True  # Enable streaming response
             )
-            
-            # Yield each chunk of the response as it becomes available
-            for chunk in stream:
-                if chunk.choices[0].delta.content is not None:
-                    yield chunk.choices[0].delta.content
 
-        # Return a streaming response to the client
-        return StreamingResponse(generate(), media_type="text/plain")
+            # Return a streaming response to the client, sending the response in batches as it becomes available
+            return LeasedStreamingResponse(client, batch_stream(stream), media_type="text/plain")
     
+    except HTTPException:
+        raise
     except Exception as e:
         # Handle any errors that occur during processing
         raise HTTPException(status_code=500, detail=str(e))
 
 # New endpoint: Suggest options for a decision
 @app.post("/api/suggest-options")
+@cached("suggest-options")
 async def suggest_options(request: SuggestOptionsRequest):
     try:
-        client = OpenAI(api_key=request.api_key)
-        
-        prompt = f"""
-        You are a decision-making assistant. A user needs to make the following decision:
-        
-        "{request.decision}"
-        
-        Please suggest 4-6 realistic and diverse options they could consider. 
-        Provide your response as a JSON array of strings, where each string is a potential option.
-        
-        Example format:
-        ["Option 1", "Option 2", "Option 3", "Option 4"]
-        
-        Make sure the options are:
-        1. Realistic and actionable
-        2. Diverse in approach
-        3. Relevant to the decision context
-        4. Clearly stated
-        """
-        
         messages = [
-            {"role": "system", "content": "You are a helpful decision-making assistant. Always respond with valid JSON."},
-            {"role": "user", "content": prompt}
+            {"role": "system", "content": JSON_SYSTEM_PROMPT},
+            {"role": "user", "content": SUGGEST_OPTIONS_INSTRUCTIONS},
+            {"role": "user", "content": SUGGEST_OPTIONS_TEMPLATE.format(decision=request.decision)}
         ]
         
-        response_content = await get_llm_response(client, messages, request.model)
+        with leased_client(request.api_key) as client:
+            response_content = await get_llm_response(client, messages, request.model)
         
         # Try to parse the JSON response
         try:
-            options = json.loads(response_content)
+            options = orjson.loads(response_content)
             if not isinstance(options, list):
                 raise ValueError("Response is not a list")
             return {"options": options}
-        except (json.JSONDecodeError, ValueError):
-            # Fallback: extract options from text
-            lines = response_content.strip().split('\n')
-            options = []
-            for line in lines:
-                line = line.strip()
-                if line and (line.startswith('"') or line.startswith('•') or line.startswith('-') or line.startswith('*')):
-                    # Clean up the line
-                    clean_option = line.strip('•-*"').strip()
-                    if clean_option:
-                        options.append(clean_option)
+        except (orjson.JSONDecodeError, ValueError):
+            # Fallback: extract bullet/quoted lines from text
+            options = BULLET_RE.findall(response_content)
             
-            return {"options": options[:6]}  # Limit to 6 options
+            # Limit to 6 options; returned as a Response so the fallback is not cached
+            return ORJSONResponse({"options": options[:6]})
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # New endpoint: Suggest criteria and weights
 @app.post("/api/suggest-criteria")
+@cached("suggest-criteria")
 async def suggest_criteria(request: SuggestCriteriaRequest):
     try:
-        client = OpenAI(api_key=request.api_key)
-        
-        options_text = "\n".join([f"- {option}" for option in request.options])
+        options_text = "\n".join(f"- {option}" for option in request.options)
         
-        prompt = f"""
-        You are a decision-making assistant. A user needs to make this decision:
-        
-        "{request.decision}"
-        
-        They are considering these options:
-        {options_text}
-        
-        Please suggest 4-6 important criteria they should consider when evaluating these options, along with suggested weights (importance percentages that sum to 100%).
-        
-        Provide your response as a JSON array of objects, where each object has "name" and "weight" properties.
-        
-        Example format:
-        [
-            {{"name": "Cost", "weight": 25}},
-            {{"name": "Time Required", "weight": 20}},
-            {{"name": "Long-term Benefits", "weight": 30}},
-            {{"name": "Risk Level", "weight": 25}}
-        ]
-        
-        Make sure:
-        1. Criteria are relevant to the decision and options
-        2. Weights are realistic and sum to 100
-        3. Include both quantitative and qualitative factors
-        4. Consider short-term and long-term impacts
-        """
+        prompt = SUGGEST_CRITERIA_TEMPLATE.format(decision=request.decision, options_text=options_text)
         
         messages = [
-            {"role": "system", "content": "You are a helpful decision-making assistant. Always respond with valid JSON."},
+            {"role": "system", "content": JSON_SYSTEM_PROMPT},
+            {"role": "user", "content": SUGGEST_CRITERIA_INSTRUCTIONS},
             {"role": "user", "content": prompt}
         ]
         
-        response_content = await get_llm_response(client, messages, request.model)
+        with leased_client(request.api_key) as client:
+            response_content = await get_llm_response(client, messages, request.model)
         
         # Try to parse the JSON response
         try:
-            criteria = json.loads(response_content)
-            if not isinstance(criteria, list):
-                raise ValueError("Response is not a list")
+            criteria = CriteriaList.validate_json(response_content)
             
             # Validate weights sum to approximately 100
-            total_weight = sum(c.get('weight', 0) for c in criteria)
-            if abs(total_weight - 100) > 5:  # Allow small variance
+            total_weight = sum(c.weight for c in criteria)
+            if total_weight > 0 and abs(total_weight - 100) > 5:  # Allow small variance
                 # Normalize weights to sum to 100
                 for criterion in criteria:
-                    criterion['weight'] = round((criterion.get('weight', 0) / total_weight) * 100, 1)
+                    criterion.weight = round((criterion.weight / total_weight) * 100, 1)
             
             return {"criteria": criteria}
-        except (json.JSONDecodeError, ValueError):
+        except ValueError:  # Also covers pydantic.ValidationError
             # Fallback: create default criteria
             default_criteria = [
                 {"name": "Cost", "weight": 25},
@@ -218,8 +792,11 @@ async def suggest_criteria(request: SuggestCriteriaRequest):
                 {"name": "Long-term Impact", "weight": 25},
                 {"name": "Personal Preference", "weight": 25}
             ]
-            return {"criteria": default_criteria}
+            # Returned as a Response so the fallback is not cached
+            return ORJSONResponse({"criteria": default_criteria})
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -227,113 +804,106 @@ async def suggest_criteria(request: SuggestCriteriaRequest):
 @app.post("/api/conversational-options")
 async def conversational_options(request: ConversationalOptionsRequest):
     try:
-        client = OpenAI(api_key=request.api_key)
-        
-        # Build conversation context
-        conversation_context = ""
-        if request.conversation_history:
-            for msg in request.conversation_history[-6:]:  # Keep last 6 messages for context
-                role = msg.get("role", "")
-                content = msg.get("content", "")
-                if role == "user":
-                    conversation_context += f"User: {content}\n"
-                elif role == "assistant":
-                    conversation_context += f"Assistant: {content}\n"
-        
-        current_options_text = "\n".join([f"- {option}" for option in request.current_options]) if request.current_options else "None yet"
-        
-        system_prompt = """You are a helpful decision-making assistant specializing in generating and refining options. 
-
-Your role is to:
-1. Help users brainstorm creative and realistic options for their decisions
-2. Suggest refinements or variations of existing options
-3. Ask clarifying questions to better understand their needs
-4. Provide context and insights about different approaches
-5. Help them think outside the box while staying practical
-
-Guidelines:
-- Be conversational and engaging
-- Ask follow-up questions when helpful
-- Suggest specific, actionable options
-- Consider both conventional and unconventional approaches
-- Help users explore different angles and perspectives
-- Keep responses concise but informative
-- When suggesting options, explain briefly why they might be worth considering
-
-You should respond naturally to the user's questions and requests about their decision options."""
-
-        user_prompt = f"""Decision Context: "{request.decision}"
-
-Current options the user has:
-{current_options_text}
-
-Recent conversation:
-{conversation_context}
-
-User's current message: "{request.user_message}"
-
-Please respond conversationally to help them with their options. If they're asking for new suggestions, provide 2-4 specific options with brief explanations. If they're asking questions or want refinements, address those directly."""
+        # Pass the recent conversation to the model as native chat messages
+        # (the entries are already validated {"role", "content"} dicts, so they are forwarded as-is)
+        history = request.conversation_history[-CONVERSATION_HISTORY_WINDOW:]
+        # The frontend includes the current message in the history; it is sent in the final message instead
+        if history and history[-1]["role"] == "user" and history[-1]["content"] == request.user_message:
+            history.pop()
+        
+        current_options_text = "\n".join(f"- {option}" for option in request.current_options) if request.current_options else "None yet"
+        
+        user_prompt = CONVERSATIONAL_USER_TEMPLATE.format(
+            decision=request.decision,
+            current_options_text=current_options_text,
+            user_message=request.user_message,
+        )
         
+        # Older history is dropped first if it is over the token budget
         messages = [
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": CONVERSATIONAL_SYSTEM_PROMPT},
+            {"role": "user", "content": CONVERSATIONAL_INSTRUCTIONS},
+            *cap_history(history),
             {"role": "user", "content": user_prompt}
         ]
         
-        response_content = await get_llm_response(client, messages, request.model)
-        
-        return {
-            "response": response_content,
-            "suggested_options": []  # We'll extract these in the frontend if needed
-        }
+        with leased_client(request.api_key) as client:
+            stream = await get_llm_stream(client, messages, request.model)
+            
+            # Stream the reply so the client can render it as it is generated
+            return LeasedStreamingResponse(client, batch_stream(stream), media_type="text/plain")
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # New endpoint: Generate implementation plan
 @app.post("/api/generate-plan")
+@cached_stream("generate-plan", media_type="text/markdown")
 async def generate_plan(request: GeneratePlanRequest):
     try:
-        client = OpenAI(api_key=request.api_key)
-        
-        criteria_text = "\n".join([f"- {c['name']}: {c['weight']}%" for c in request.criteria])
+        criteria_text = "\n".join(f"- {c.name}: {c.weight:g}%" for c in request.criteria)
         
-        prompt = f"""
-        You are a decision-making assistant. A user has made the following decision:
-        
-        Decision: "{request.decision}"
-        Selected Option: "{request.selected_option}"
-        
-        This choice was evaluated based on these criteria:
-        {criteria_text}
-        
-        Please create a detailed implementation plan for executing this decision. Include:
-        
-        1. **Immediate Next Steps** (What to do in the next 1-7 days)
-        2. **Short-term Actions** (What to do in the next 1-4 weeks)
-        3. **Medium-term Milestones** (What to achieve in 1-3 months)
-        4. **Long-term Goals** (What to accomplish in 3-12 months)
-        5. **Potential Challenges** and how to address them
-        6. **Success Metrics** to track progress
-        7. **Resources Needed** (time, money, people, tools, etc.)
-        
-        Make the plan:
-        - Specific and actionable
-        - Realistic and achievable
-        - Well-structured with clear timelines
-        - Comprehensive but not overwhelming
-        
-        Use markdown formatting for better readability.
-        """
+        prompt = GENERATE_PLAN_TEMPLATE.format(
+            decision=request.decision,
+            selected_option=request.selected_option,
+            criteria_text=criteria_text,
+        )
         
         messages = [
-            {"role": "system", "content": "You are a helpful decision-making and planning assistant. Provide detailed, actionable plans."},
-            {"role": "user", "content": prompt}
+            [
+                {"role": "system", "content": PLAN_SYSTEM_PROMPT},
+                {"role": "user", "content": instructions},
+                {"role": "user", "content": prompt}
+            ]
+            for instructions in (GENERATE_PLAN_TIMELINE_INSTRUCTIONS, GENERATE_PLAN_SUPPORT_INSTRUCTIONS)
         ]
         
-        response_content = await get_llm_response(client, messages, request.model)
-        
-        return {"plan": response_content}
+        with leased_client(request.api_key) as client:
+            # Start both parts of the plan concurrently; if either fails, close the one that opened
+            # so its completion does not keep generating (and billing) tokens
+            streams = await asyncio.gather(
+                *(get_llm_stream(client, m, request.model) for m in messages),
+                return_exceptions=True
+            )
+            errors = [result for result in streams if isinstance(result, BaseException)]
+            if errors:
+                for stream in streams:
+                    if not isinstance(stream, BaseException):
+                        await stream.close()
+                raise errors[0]
+            timeline_stream, support_stream = streams
+            
+            # Stream the timeline while the closing sections are buffered, then stream those in order
+            async def generate():
+                support_queue = asyncio.Queue()
+                
+                async def buffer_support():
+                    try:
+                        async for text in batch_stream(support_stream):
+                            await support_queue.put(text)
+                    finally:
+                        await support_queue.put(None)
+                
+                support_task = asyncio.create_task(buffer_support())
+                try:
+                    async for text in batch_stream(timeline_stream):
+                        yield text
+                    yield "\n\n"
+                    while (text := await support_queue.get()) is not None:
+                        yield text
+                    # Re-raise any error from the closing sections' stream
+                    await support_task
+                finally:
+                    # Stop buffering the closing sections on errors or client disconnects
+                    # (batch_stream closes each completion)
+                    support_task.cancel()
+            
+            return LeasedStreamingResponse(client, generate(), media_type="text/markdown")
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -345,5 +915,8 @@ async def health_check():
 # Entry point for running the application directly
 if __name__ == "__main__":
     import uvicorn
+    # Run one worker process per CPU core (override with WEB_CONCURRENCY); the workers share
+    # the listening socket, so the kernel spreads incoming connections across them
+    workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
     # Start the server on all network interfaces (0.0.0.0) on port 8000
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run("app:app", host="0.0.0.0", port=8000, workers=workers, backlog=4096)
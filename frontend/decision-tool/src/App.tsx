@@ -394,15 +394,19 @@ function App() {
     setLoadingPlan(true);
     
     try {
+      // Show the plan step as soon as the first part of the plan arrives
+      const showPlan = (plan: string) => {
+        setDecision(prev => ({ ...prev, implementationPlan: plan }));
+        setCurrentStep('plan');
+      };
       const response = await decisionAPI.generatePlan({
         decision: decision.question,
         selected_option: topResult.optionName,
         criteria: decision.criteria.map(c => ({ name: c.name, weight: c.weight })),
         api_key: apiKey
-      });
+      }, showPlan);
       
-      setDecision(prev => ({ ...prev, implementationPlan: response.plan }));
-      setCurrentStep('plan');
+      showPlan(response.plan);
     } catch (error) {
       console.error('Failed to generate implementation plan:', error);
     } finally {
@@ -452,10 +456,15 @@ function App() {
       if (apiKey) {
         const response = await decisionAPI.conversationalOptions({
           decision: decision.question,
-          conversation_history: updatedHistory,
+          // The API only uses the most recent messages (and rejects more than 50)
+          conversation_history: updatedHistory.slice(-6),
           current_options: decision.options.map(opt => opt.name),
           user_message: userMessage,
           api_key: apiKey
+        }, (reply) => {
+          // Replace the typing indicator with the reply as it streams in
+          setLoadingChat(false);
+          setConversationHistory([...updatedHistory, { role: 'assistant', content: reply }]);
         });
 
         // Add assistant response to conversation
@@ -53,7 +53,29 @@ export interface ConversationalOptionsRequest {
 
 export interface ConversationalOptionsResponse {
   response: string;
-  suggested_options: string[];
+}
+
+// POST to a streaming endpoint, calling onChunk with the text received so far
+async function postStream(path: string, request: object, onChunk?: (text: string) => void): Promise<string> {
+  const response = await fetch(`${API_BASE_URL}${path}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(request),
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`Request failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let text = '';
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    text += decoder.decode(value, { stream: true });
+    onChunk?.(text);
+  }
+  return text + decoder.decode();
 }
 
 // API functions
@@ -85,12 +107,13 @@ export const decisionAPI = {
   },
 
   /**
-   * Generate an implementation plan for the selected decision
+   * Generate an implementation plan for the selected decision.
+   * The plan is streamed; onChunk is called with the plan text received so far.
    */
-  async generatePlan(request: GeneratePlanRequest): Promise<GeneratePlanResponse> {
+  async generatePlan(request: GeneratePlanRequest, onChunk?: (plan: string) => void): Promise<GeneratePlanResponse> {
     try {
-      const response = await axios.post(`${API_BASE_URL}/generate-plan`, request);
-      return response.data;
+      const plan = await postStream('/generate-plan', request, onChunk);
+      return { plan };
     } catch (error) {
       console.error('Error generating plan:', error);
       throw new Error('Failed to generate implementation plan from LLM');
@@ -98,12 +121,13 @@ export const decisionAPI = {
   },
 
   /**
-   * Get conversational help with generating and refining options
+   * Get conversational help with generating and refining options.
+   * The reply is streamed; onChunk is called with the reply text received so far.
    */
-  async conversationalOptions(request: ConversationalOptionsRequest): Promise<ConversationalOptionsResponse> {
+  async conversationalOptions(request: ConversationalOptionsRequest, onChunk?: (reply: string) => void): Promise<ConversationalOptionsResponse> {
     try {
-      const response = await axios.post(`${API_BASE_URL}/conversational-options`, request);
-      return response.data;
+      const reply = await postStream('/conversational-options', request, onChunk);
+      return { response: reply };
     } catch (error) {
       console.error('Error with conversational options:', error);
       throw new Error('Failed to get conversational help with options');